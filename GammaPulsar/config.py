@@ -1,19 +1,20 @@
-import os
+from functools import cached_property
 from pathlib import Path
 import yaml
-from yaml.loader import SafeLoader
 
 __all__ = ["FermiConfig", "FermiSerializedConfig"]
 
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+Dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
 
 class FermiConfig:
     def __init__(self, config_file):
 
         self._config_file = config_file
         with open(config_file, "r") as stream:
-            config = yaml.safe_load(stream)
+            config = yaml.load(stream, Loader=Loader)
             self._dict = config
-            stream.close()
 
     @property
     def selection(self):
@@ -58,24 +59,20 @@ class FermiConfig:
         if isinstance(filename, str):
             filename = Path(filename)
 
-        if filename.name[-5:] != ".yaml":
-            filename = Path(filename.name + "yaml")
+        if filename.suffix != ".yaml":
+            filename = filename.with_name(filename.name + ".yaml")
 
-        with open(filename, "w") as outfile:
-            yaml.dump(self._dict, outfile, sort_keys=False, **kwargs)
-            outfile.close()
+        with open(filename, "w", buffering=65536) as outfile:
+            yaml.dump(self._dict, outfile, Dumper=Dumper, sort_keys=False, **kwargs)
 
     def make_phase_binned_directory(self, phase_axis, dir_path=None):
 
-        if dir_path is None:
-            base_path = Path("./")
-        else:
-            base_path = Path(dir_path)
-        for edge_min, edge_max in zip(
-            phase_axis.edges_min.value, phase_axis.edges_max.value
-        ):
-            dir_name = Path("phase_" + str(edge_min) + "-" + str(edge_max))
-            out_dir = Path(os.path.join(base_path, dir_name))
+        base_path = Path(dir_path) if dir_path else Path(".")
+        edges_min = phase_axis.edges_min.value
+        edges_max = phase_axis.edges_max.value
+        for edge_min, edge_max in zip(edges_min, edges_max):
+            tag = f"{edge_min:.6g}-{edge_max:.6g}"
+            out_dir = base_path / f"phase_{tag}"
             out_dir.mkdir(parents=True, exist_ok=True)
             self.add_entry(
                 primary_dict="selection", entry="phasemin", value=float(edge_min)
@@ -83,9 +80,7 @@ class FermiConfig:
             self.add_entry(
                 primary_dict="selection", entry="phasemax", value=float(edge_max)
             )
-            outfile = Path("config_" + str(edge_min) + "-" + str(edge_max) + ".yaml")
-            full_path = Path(os.path.join(out_dir, outfile))
-            self.write(full_path)
+            self.write(out_dir / f"config_{tag}.yaml")
 
 
 class FermiSerializedConfig:
@@ -96,46 +91,69 @@ class FermiSerializedConfig:
 
         self.config_file = config_file
         with open(config_file, "r") as stream:
-            config = yaml.load(stream, Loader=SafeLoader)
+            config = yaml.load(stream, Loader=Loader)
             self.to_dict = config
-            stream.close()
+        self._spectral = self.to_dict.get("spectral", {})
+        self._default_spectral = self._spectral.get("default")
+
+    @classmethod
+    def peek(cls, config_file, keys=("source_name",), nbytes=4096):
+
+        with open(config_file, "rb") as stream:
+            head = stream.read(nbytes)
+            truncated = bool(stream.read(1))
+        if truncated:
+            head = head[: head.rfind(b"\n") + 1]
+        try:
+            config = yaml.load(head, Loader=Loader) or {}
+        except yaml.YAMLError:
+            config = {}
+        if truncated and (
+            not isinstance(config, dict)
+            or any(key not in config for key in keys)
+            or next(reversed(config), None) in keys
+        ):
+            # The last top-level entry of a truncated header may be incomplete
+            with open(config_file, "r") as stream:
+                config = yaml.load(stream, Loader=Loader)
+        return {key: config[key] for key in keys}
 
-    @property
+    @cached_property
     def source_name(self):
 
         return self.to_dict["source_name"]
 
-    @property
+    @cached_property
     def free_sources_distance(self):
 
         return self.to_dict["free_sources"]["distance"]
 
-    @property
+    @cached_property
     def free_sources_param(self):
 
         return self.to_dict["free_sources"]["pars"]
 
-    @property
+    @cached_property
     def free_isodiff(self):
 
         return self.to_dict["free_diff"]["isodiff"]
 
-    @property
+    @cached_property
     def free_galdiff(self):
 
         return self.to_dict["free_diff"]["galdiff"]
 
-    @property
+    @cached_property
     def free_source(self):
 
         return self.to_dict["free_source"]
 
-    @property
+    @cached_property
     def write_roi(self):
 
         return self.to_dict["roi"]["write"]
 
-    @property
+    @cached_property
     def roi_filename(self):
 
         if self.write_roi:
@@ -143,44 +161,44 @@ class FermiSerializedConfig:
         else:
             return None
 
-    @property
+    @cached_property
     def default_spectral(self):
 
-        return self.to_dict["spectral"]["default"]
+        return self._default_spectral
 
-    @property
+    @cached_property
     def spectrum_type(self):
 
-        if self.default_spectral:
+        if self._default_spectral:
             return "Default"
         else:
-            return self.to_dict["spectral"]["spectrum_type"]
+            return self._spectral["spectrum_type"]
 
-    @property
+    @cached_property
     def index(self):
 
-        if self.default_spectral:
+        if self._default_spectral:
             return "Default"
         else:
-            return self.to_dict["spectral"]["index"]
+            return self._spectral["index"]
 
-    @property
+    @cached_property
     def prefactor(self):
 
-        if self.default_spectral:
+        if self._default_spectral:
             return "Default"
         else:
-            return self.to_dict["spectral"]["index"]
+            return self._spectral["prefactor"]
 
-    @property
+    @cached_property
     def scale(self):
 
-        if self.default_spectral:
+        if self._default_spectral:
             return "Default"
         else:
-            return self.to_dict["spectral"]["index"]
+            return self._spectral["scale"]
 
-    @property
+    @cached_property
     def sed_type(self):
 
         return self.to_dict["sed"]["sed_type"]
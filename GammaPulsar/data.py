@@ -1,6 +1,6 @@
 import collections.abc
-import copy
 import re
+from concurrent.futures import ThreadPoolExecutor
 import astropy.units as u
 from astropy.coordinates import SkyCoord
 from astropy.io import fits
@@ -16,6 +16,8 @@ __all__ = [
     "FermiObservations",
 ]
 
+_DS_SPLIT = re.compile(r"[(,)]")
+
 
 class FermiFiles:
     def __init__(self, events_files, spacecraft_file):
@@ -38,12 +40,12 @@ class FermiEventList:
     def region(self):
 
         meta = self.table.meta
-        ds3 = [meta["DSTYP3"], meta["DSUNI3"], meta["DSVAL3"]]
+        ds_type, ds_unit, ds_value = meta["DSTYP3"], meta["DSUNI3"], meta["DSVAL3"]
 
-        if ds3[0] == "POS(RA,DEC)" and ds3[1] == "deg":
+        if ds_type == "POS(RA,DEC)" and ds_unit == "deg":
 
-            region_str = re.split(r"[(,)]", ds3[2])
-            center = SkyCoord(region_str[1], region_str[2], unit=ds3[1], frame="icrs")
+            region_str = _DS_SPLIT.split(ds_value)
+            center = SkyCoord(region_str[1], region_str[2], unit=ds_unit, frame="icrs")
             return CircleSkyRegion(center, radius=float(region_str[3]) * u.deg)
         else:
             raise NotImplementedError
@@ -57,9 +59,9 @@ class FermiEventList:
     def energy(self):
 
         meta = self.table.meta
-        DS5 = [meta["DSTYP5"], meta["DSUNI5"], meta["DSVAL5"]]
-        energy = [float(_) for _ in DS5[2].split(":")]
-        return energy * u.Unit(DS5[1])
+        ds_unit, ds_value = meta["DSUNI5"], meta["DSVAL5"]
+        energy = [float(_) for _ in ds_value.split(":")]
+        return energy * u.Unit(ds_unit)
 
     @property
     def time(self):
@@ -67,18 +69,36 @@ class FermiEventList:
 
     def copy(self):
 
-        return copy.deepcopy(self)
+        # The primary HDU has no data, copying its header avoids deep-copying the open file
+        primary_hdu = None
+        if self._primary_hdu is not None:
+            primary_hdu = fits.PrimaryHDU(header=self._primary_hdu.header.copy())
+        return self.__class__(
+            table=self.table.copy(copy_data=True),
+            primary_hdu=primary_hdu,
+            filename=self._filename,
+        )
 
     @classmethod
-    def read(cls, filename, primary=True, **kwargs):
+    def read(cls, filename, primary=True, lazy=True, **kwargs):
 
         filename = make_path(filename)
         kwargs.setdefault("hdu", "EVENTS")
-        table = Table.read(filename, **kwargs)
-        if primary:
-            primary_hdu = fits.PrimaryHDU().readfrom(filename)
+        if lazy:
+            # Memory-mapped, column data is only paged in when accessed and stays mapped
+            # after the file is closed. String columns are kept as bytes, as Table.read does,
+            # decoding them would copy them
+            with fits.open(filename, memmap=True, character_as_bytes=True) as hdulist:
+                table = Table.read(hdulist[kwargs.pop("hdu")], **kwargs)
+                primary_hdu = None
+                if primary:
+                    primary_hdu = fits.PrimaryHDU(header=hdulist[0].header.copy())
         else:
-            primary_hdu = None
+            table = Table.read(filename, **kwargs)
+            if primary:
+                primary_hdu = fits.PrimaryHDU().readfrom(filename)
+            else:
+                primary_hdu = None
         return cls(table=table, primary_hdu=primary_hdu, filename=filename)
 
     def to_table_hdu(self):
@@ -110,12 +130,12 @@ class GTI:
         self.table = table
 
     def copy(self):
-        return copy.deepcopy(self)
+        return self.__class__(self.table.copy(copy_data=True))
 
     @classmethod
-    def read(cls, filename, hdu="GTI"):
+    def read(cls, filename, hdu="GTI", **kwargs):
         filename = make_path(filename)
-        table = Table.read(filename, hdu=hdu)
+        table = Table.read(filename, hdu=hdu, **kwargs)
         return cls(table)
 
     def to_table_hdu(self):
@@ -136,6 +156,9 @@ class FermiSpacecraft:
     def filename(self):
         return self._filename
 
+    def copy(self):
+        return self.__class__(self.table.copy(copy_data=True), filename=self._filename)
+
     @classmethod
     def read(cls, filename, **kwargs):
         filename = make_path(filename)
@@ -168,7 +191,11 @@ class FermiObservation:
 
     def copy(self):
 
-        return copy.deepcopy(self)
+        return self.__class__(
+            events=None if self._events is None else self._events.copy(),
+            gti=None if self._gti is None else self._gti.copy(),
+            spacecraft=None if self._spacecraft is None else self._spacecraft.copy(),
+        )
 
     def write(self):
         pass
@@ -179,20 +206,36 @@ class FermiObservations(collections.abc.MutableSequence):
         self._observations = observations or []
 
     def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return self._observations[key]
         return self._observations[self.index(key)]
 
     def __delitem__(self, key):
-        del self._observations[self.index(key)]
+        if not isinstance(key, (int, slice)):
+            key = self.index(key)
+        del self._observations[key]
 
     def __setitem__(self, key, obs):
         if isinstance(obs, FermiObservation):
-            self._observations[self.index(key)] = obs
+            if not isinstance(key, (int, slice)):
+                key = self.index(key)
+            self._observations[key] = obs
         else:
             raise TypeError(f"Invalid type: {type(obs)!r}")
 
     def __len__(self):
         return len(self._observations)
 
+    def __iter__(self):
+        return iter(self._observations)
+
+    def extend(self, observations):
+        observations = list(observations)
+        for obs in observations:
+            if not isinstance(obs, FermiObservation):
+                raise TypeError(f"Invalid type: {type(obs)!r}")
+        self._observations.extend(observations)
+
     def insert(self, idx, obs):
         if isinstance(obs, FermiObservation):
             self._observations.insert(idx, obs)
@@ -217,20 +260,26 @@ class FermiObservations(collections.abc.MutableSequence):
     @classmethod
     def from_files(cls, events_files, spacecraft, gti=True):
 
-        observations = []
         if isinstance(spacecraft, list):
             raise TypeError(
                 "a unique spacecraft file is allowed to create FermiObservations"
             )
 
         spacecraft = FermiSpacecraft.read(spacecraft)
-        for file in events_files:
-            events = FermiEventList.read(file)
-            if gti:
-                gti = GTI.read(file)
-            else:
-                gti = None
-            observations.append(
-                FermiObservation(events=events, gti=gti, spacecraft=spacecraft)
-            )
+
+        def read_observation(file):
+            filename = make_path(file)
+            # The tables stay memory-mapped after the file is closed, string columns are
+            # kept as bytes as in FermiEventList.read
+            with fits.open(filename, memmap=True, character_as_bytes=True) as hdulist:
+                events = FermiEventList(
+                    table=Table.read(hdulist["EVENTS"]),
+                    primary_hdu=fits.PrimaryHDU(header=hdulist[0].header.copy()),
+                    filename=filename,
+                )
+                obs_gti = GTI(Table.read(hdulist["GTI"])) if gti else None
+            return FermiObservation(events=events, gti=obs_gti, spacecraft=spacecraft)
+
+        with ThreadPoolExecutor() as executor:
+            observations = list(executor.map(read_observation, events_files))
         return FermiObservations(observations=observations)
@@ -1,12 +1,24 @@
 import collections.abc
 import glob
 import os
+from contextlib import contextmanager
 from fermipy.gtanalysis import GTAnalysis
 from GammaPulsar.config import FermiConfig, FermiSerializedConfig
 
 __all__ = ["FermiAnalysis", "FermiAnalysisList", "FermiAnalysisSerialize"]
 
 
+@contextmanager
+def _chdir(path):
+
+    old_dir = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old_dir)
+
+
 class FermiAnalysis(GTAnalysis):
     def __init__(
         self,
@@ -56,20 +68,29 @@ class FermiAnalysisList(collections.abc.MutableSequence):
         self._analysis = analysis or []
 
     def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return self._analysis[key]
         return self._analysis[self.index(key)]
 
     def __delitem__(self, key):
-        del self._analysis[self.index(key)]
+        if not isinstance(key, (int, slice)):
+            key = self.index(key)
+        del self._analysis[key]
 
     def __setitem__(self, key, ana):
         if isinstance(ana, FermiAnalysis):
-            self._analysis[self.index(key)] = ana
+            if not isinstance(key, (int, slice)):
+                key = self.index(key)
+            self._analysis[key] = ana
         else:
             raise TypeError(f"Invalid type: {type(ana)!r}")
 
     def __len__(self):
         return len(self._analysis)
 
+    def __iter__(self):
+        return iter(self._analysis)
+
     def insert(self, idx, ana):
         if isinstance(ana, FermiAnalysis):
             self._analysis.insert(idx, ana)
@@ -108,9 +129,18 @@ class FermiAnalysisSerialize:
         self._dir_prefix = dir_prefix
         self._config_prefix = config_prefix
         self._analysis_config = FermiSerializedConfig(analysis_config)
+        self._list_dir = self._scan_dirs(dir_prefix)
+        self._list_config = [
+            glob.glob(os.path.join(directory, config_prefix))[0]
+            for directory in self._list_dir
+        ]
         self._fermi_analysis = FermiAnalysisList.from_file(
             configs=self.list_config, dir_paths=self.list_dir
         )
+        self._abs_dirs = [
+            os.path.abspath(ana.dir_path) if ana.dir_path else os.getcwd()
+            for ana in self._fermi_analysis
+        ]
 
     @property
     def analysis_config(self):
@@ -130,15 +160,23 @@ class FermiAnalysisSerialize:
     @property
     def list_dir(self):
 
-        return glob.glob(self.dir_prefix + "*")
+        return self._list_dir
 
     @property
     def list_config(self):
 
-        config_list = []
-        for directory in self.list_dir:
-            config_list.append(glob.glob(directory + "/" + self.config_prefix)[0])
-        return config_list
+        return self._list_config
+
+    @staticmethod
+    def _scan_dirs(dir_prefix):
+
+        parent, prefix = os.path.split(dir_prefix)
+        with os.scandir(parent or ".") as entries:
+            return [
+                os.path.join(parent, entry.name)
+                for entry in entries
+                if entry.name.startswith(prefix) and entry.is_dir()
+            ]
 
     @property
     def fermi_analysis(self):
@@ -151,42 +189,41 @@ class FermiAnalysisSerialize:
         roi_postfit = []
         fit_results = []
         sed = []
-        work_dir = os.getcwd()
-        for ana in self.fermi_analysis:
-
-            os.chdir(work_dir + ana.dir_path)
-
-            ana.setup()
-
-            roi = ana.roi[self.analysis_config.source_name]
-            if not self.analysis_config.default_spectral:
-                roi.spectral_pars["Index"] = self.analysis_config.index
-                roi.spectral_pars["Prefactor"] = self.analysis_config.prefactor
-                roi.spectral_pars["Scale"] = self.analysis_config.scale
-
-            ana.free_sources(
-                distance=self.analysis_config.free_sources_distance,
-                pars=self.analysis_config.free_sources_param,
-            )
-            if self.analysis_config.free_galdiff:
-                ana.free_source("galdiff")
-            if self.analysis_config.free_isodiff:
-                ana.free_source("isodiff")
-            if self.analysis_config.free_source:
-                ana.free_source(self.analysis_config.source_name)
-            roi = ana.roi[self.analysis_config.source_name]
-            roi_prefit.append(roi)
-
-            fit_res = ana.fit()
-            fit_results.append(fit_res)
-
-            roi = ana.roi[self.analysis_config.source_name]
-            roi_postfit.append(roi)
-
-            if self.analysis_config.write_roi:
-                ana.write_roi(self.analysis_config.roi_filename)
-
-            sed.append(ana.sed(self.analysis_config.source_name))
+        cfg = self.analysis_config
+        source_name = cfg.source_name
+        for ana, target in zip(self.fermi_analysis, self._abs_dirs):
+
+            with _chdir(target):
+
+                ana.setup()
+
+                roi = ana.roi[source_name]
+                if not cfg.default_spectral:
+                    roi.spectral_pars["Index"] = cfg.index
+                    roi.spectral_pars["Prefactor"] = cfg.prefactor
+                    roi.spectral_pars["Scale"] = cfg.scale
+
+                ana.free_sources(
+                    distance=cfg.free_sources_distance,
+                    pars=cfg.free_sources_param,
+                )
+                if cfg.free_galdiff:
+                    ana.free_source("galdiff")
+                if cfg.free_isodiff:
+                    ana.free_source("isodiff")
+                if cfg.free_source:
+                    ana.free_source(source_name)
+                roi_prefit.append(roi)
+
+                fit_res = ana.fit()
+                fit_results.append(fit_res)
+
+                roi_postfit.append(ana.roi[source_name])
+
+                if cfg.write_roi:
+                    ana.write_roi(cfg.roi_filename)
+
+                sed.append(ana.sed(source_name))
 
         setattr(self, "roi_prefit", roi_prefit)
         setattr(self, "roi_postfit", roi_postfit)
@@ -1,9 +1,19 @@
 import collections.abc
+import itertools
 import logging as log
 import os
+import re
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+import numpy as np
+import astropy.units as u
 from astropy.io import fits
 from astropy.table import Table
 from gammapy.utils.scripts import make_path
+from GammaPulsar.utils import make_file_path
 
 __all__ = [
     "FermiEvents",
@@ -12,69 +22,347 @@ __all__ = [
     "FermiObservations",
 ]
 
+_FITS_BACKENDS = ("astropy", "fitsio")
+
+_AGGREGATED_KEYWORD = "NEVTHDU"
+
+_HDULIST_CACHE_SIZE = 64
+_hdulist_cache = OrderedDict()
+_hdulist_cache_lock = threading.Lock()
+
+_STRUCTURAL_KEYWORD = re.compile(
+    r"^(XTENSION|BITPIX|NAXIS\d*|PCOUNT|GCOUNT|TFIELDS|T[A-Z]+\d+|COMMENT|HISTORY|)$"
+)
+
+
+def _get_fits_backend(backend=None):
+    """Resolve the FITS reading backend, defaulting to ``$GAMMAPULSAR_FITS_BACKEND``"""
+    if backend is None:
+        backend = os.environ.get("GAMMAPULSAR_FITS_BACKEND", "astropy")
+    if backend not in _FITS_BACKENDS:
+        raise ValueError(
+            f"Invalid FITS backend {backend!r}, must be one of {_FITS_BACKENDS}"
+        )
+    return backend
+
+
+def _open_hdulist(filename):
+    """
+    Open a FITS file memory-mapped, reusing the HDUList of a previous call on the same file.
+
+    Entries are keyed on the resolved absolute path and modification time, so a rewritten file is
+    reopened and the HDUList of its previous version is closed. At most ``_HDULIST_CACHE_SIZE``
+    files are kept open, the least recently used one being closed first.
+    """
+    path = os.path.realpath(filename)
+    key = (path, os.stat(path).st_mtime_ns)
+    with _hdulist_cache_lock:
+        hdulist = _hdulist_cache.get(key)
+        if hdulist is not None:
+            _hdulist_cache.move_to_end(key)
+            return hdulist
+        for stale_key in [key for key in _hdulist_cache if key[0] == path]:
+            _hdulist_cache.pop(stale_key).close()
+        hdulist = fits.open(
+            path,
+            memmap=True,
+            lazy_load_hdus=True,
+            do_not_scale_image_data=True,
+            character_as_bytes=True,
+        )
+        _hdulist_cache[key] = hdulist
+        if len(_hdulist_cache) > _HDULIST_CACHE_SIZE:
+            _, evicted = _hdulist_cache.popitem(last=False)
+            evicted.close()
+    return hdulist
+
+
+def _close_hdulists(filename=None):
+    """Close and forget the cached HDULists of ``filename``, or all of them if None"""
+    path = None if filename is None else os.path.realpath(filename)
+    with _hdulist_cache_lock:
+        keys = [key for key in _hdulist_cache if path is None or key[0] == path]
+        for key in keys:
+            _hdulist_cache.pop(key).close()
+
+
+def _fitsio_to_header(fitsio_header):
+    """
+    Convert a `fitsio.FITSHDR` to an `astropy.io.fits.Header`.
+
+    fitsio folds CONTINUE cards into the record of the card they continue, whose ``card_string``
+    only holds the first card, so cards are built from the record name, value and comment.
+    """
+    header = fits.Header()
+    for record in fitsio_header.records():
+        name = record["name"]
+        if name in ("COMMENT", "HISTORY"):
+            header.append(fits.Card.fromstring(record["card_string"]))
+            continue
+        if len(name) > 8 or " " in name:
+            name = f"HIERARCH {name}"
+        header.append(fits.Card(name, record["value"], record["comment"]))
+    return header
+
+
+def _read_table_fitsio(filename, hdu="EVENTS", columns=None):
+    """Read a FITS table HDU with fitsio, keeping column units and header metadata"""
+    import fitsio
+
+    data, fitsio_header = fitsio.read(
+        str(filename), ext=hdu, columns=columns, header=True
+    )
+    header = _fitsio_to_header(fitsio_header)
+    table = Table(data, copy=False)
+    # fitsio decodes string columns to str, they are returned as bytes like with astropy
+    for name in table.colnames:
+        if table[name].dtype.kind == "U":
+            table[name] = np.char.encode(table[name], "ascii")
+    for idx in range(1, header.get("TFIELDS", 0) + 1):
+        name = header.get(f"TTYPE{idx}")
+        unit = header.get(f"TUNIT{idx}")
+        if name in table.colnames and unit:
+            table[name].unit = u.Unit(unit, parse_strict="warn")
+    table.meta.update(
+        (key, value)
+        for key, value in header.items()
+        if not _STRUCTURAL_KEYWORD.match(key)
+    )
+    return table
+
 
 class FermiEvents:
     """
     Class for Fermi-LAT event file
 
+    The file is opened once, memory-mapped, on first access to `table` or `primary_header`. Open files
+    are cached and shared between `FermiEvents` instances of the same file, up to 64 files. `close`
+    releases the file of an instance, `FermiEvents` can be used as a context manager to do so, and
+    `clear_cache` releases all of them.
+
     Parameters
     ----------
     filename : str
         Path to the event file
+    columns : list of str or None
+        Names of the columns to load in `table`. If None, all columns are loaded. Default is None.
+    hdu : str or int
+        Name or index of the events HDU. Default is "EVENTS".
     """
 
-    def __init__(self, filename):
-        filename_path = make_path(filename)
-        if os.path.isfile(filename_path):
-            self._filename = filename_path
-        else:
-            raise FileNotFoundError(f"{filename} is not a path to a file.")
+    def __init__(self, filename, columns=None, hdu="EVENTS"):
+        self._filename = make_file_path(filename)
+        self._columns = columns
+        self._hdu = hdu
+        self._hdulist = None
         self._table = None
-        self._primary_hdu = None
+        self._primary_header = None
+        self._time = None
+
+    def __getstate__(self):
+        # Open files and loaded data are not sent along when pickling, they are reloaded lazily
+        state = self.__dict__.copy()
+        state.update(_hdulist=None, _table=None, _primary_header=None, _time=None)
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     @property
     def filename(self):
         """Path to the event file"""
         return self._filename
 
+    @property
+    def hdu(self):
+        """Name or index of the events HDU"""
+        return self._hdu
+
     @property
     def table(self):
         """Load events table"""
         if self._table is None:
-            self._table = self._load_file(self.filename, hdu_type="events")
+            self._table = self._load_file(
+                self._source(), hdu_type="events", columns=self._columns, hdu=self._hdu
+            )
         return self._table
 
+    @property
+    def primary_header(self):
+        """Load the header of the PrimaryHDU"""
+        if self._primary_header is None:
+            self._primary_header = self._load_file(
+                self._source(), hdu_type="primary"
+            ).header
+        return self._primary_header
+
     @property
     def primary_hdu(self):
-        """Load PrimaryHDU"""
-        if self._primary_hdu is None:
-            self._primary_hdu = self._load_file(self.filename, hdu_type="primary")
-        return self._primary_hdu
+        """PrimaryHDU built from `primary_header`. Deprecated, use `primary_header` instead"""
+        warnings.warn(
+            "FermiEvents.primary_hdu is deprecated, use FermiEvents.primary_header instead",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return fits.PrimaryHDU(header=self.primary_header)
+
+    def column_str(self, name):
+        """
+        Return a string column of `table` decoded to `str`.
+
+        String columns are loaded as bytes to keep them memory-mapped, this
+        decodes one of them on demand.
+
+        Parameters
+        ----------
+        name : str
+            Name of the column
+
+        Returns
+        -------
+        column : `numpy.ndarray`
+            Array of `str` values
+        """
+        column = np.asarray(self.table[name])
+        if column.dtype.kind == "S":
+            return np.char.decode(column, "ascii")
+        return column
+
+    def read_rows(self, start=0, stop=None, columns=None):
+        """
+        Read a range of rows of the events HDU, without loading the rest of the table.
+
+        Parameters
+        ----------
+        start : int
+            Index of the first row to read. Default is 0.
+        stop : int or None
+            Index of the row after the last one to read. If None, rows are read up to the end of
+            the HDU. Default is None.
+        columns : list of str or None
+            Names of the columns to read. If None, all columns are read. Default is None.
+
+        Returns
+        -------
+        rows : `numpy.ndarray`
+            Structured array of the rows.
+        """
+        if _get_fits_backend() == "fitsio":
+            import fitsio
+
+            with fitsio.FITS(str(self.filename)) as fitsfile:
+                hdu = fitsfile[self._hdu]
+                if columns is not None:
+                    hdu = hdu[columns]
+                return hdu[start:stop]
+        data = self._source()[self._hdu].data[start:stop]
+        if columns is None:
+            columns = data.columns.names
+        return np.rec.fromarrays([data[name] for name in columns], names=columns)
+
+    def time_rows(self, tmin=None, tmax=None):
+        """
+        Rows of the events with a ``TIME`` in ``[tmin, tmax)``.
+
+        The ``TIME`` column is read once and kept, rows are then found by binary search as events
+        are sorted in time in Fermi-LAT events files.
+
+        Parameters
+        ----------
+        tmin : float or None
+            Start of the time range, in mission elapsed time (s). If None, the range starts at the
+            first event. Default is None.
+        tmax : float or None
+            End of the time range, in mission elapsed time (s). If None, the range ends at the last
+            event. Default is None.
+
+        Returns
+        -------
+        rows : slice
+            Slice of the rows in the time range.
+        """
+        if self._time is None:
+            self._time = np.asarray(self.read_rows(columns=["TIME"])["TIME"])
+        start = 0 if tmin is None else int(np.searchsorted(self._time, tmin))
+        stop = (
+            len(self._time) if tmax is None else int(np.searchsorted(self._time, tmax))
+        )
+        return slice(start, max(start, stop))
+
+    def close(self):
+        """Close the underlying FITS file, if it has been opened"""
+        if self._hdulist is not None:
+            _close_hdulists(self.filename)
+            self._hdulist = None
+
+    @staticmethod
+    def clear_cache():
+        """Close all the FITS files opened by `FermiEvents` instances"""
+        _close_hdulists()
+
+    def _source(self):
+        """Return the object to load HDUs from: the cached HDUList, or the filename for fitsio"""
+        if _get_fits_backend() == "fitsio":
+            return self.filename
+        self._hdulist = _open_hdulist(self.filename)
+        return self._hdulist
 
     @staticmethod
-    def _load_file(filename, hdu_type="events", **kwargs):
+    def _load_file(filename, hdu_type="events", backend=None, **kwargs):
         """
         Static method that load events and primary hdu from a fits file
 
         Parameters
         ----------
-        filename : str
-            Path to the fits file
+        filename : str or `astropy.io.fits.HDUList`
+            Path to the fits file, or an already opened HDUList (astropy backend only)
         hdu_type : str
             HDU to open. Either "events" or "primary"
+        backend : {"astropy", "fitsio"} or None
+            Library used to read the file. If None, the value of the environment variable
+            ``GAMMAPULSAR_FITS_BACKEND`` is used, defaulting to "astropy". The "fitsio" backend
+            requires the optional `fitsio` package.
         **kwargs : dict
-            Keyword arguments to pass to either events hdu or primary hdu depending on `hdu_type`
+            Keyword arguments to pass to either events hdu or primary hdu depending on `hdu_type`.
+            For the events hdu, ``columns`` restricts the loaded columns and string columns are
+            returned as bytes. With the astropy backend the table is memory-mapped, so only the
+            columns that are accessed are read from disk. Masked or scaled columns are still loaded
+            in full.
 
         Returns
         -------
         table or primary_hdu : `astropy.table.Table` or `astropy.io.fits.PrimaryHDU`
             Events table or PrimaryHDU depending on `hdu_type` .
         """
+        backend = _get_fits_backend(backend)
         kwargs.setdefault("hdu", "EVENTS")
+        columns = kwargs.pop("columns", None)
+        if backend == "fitsio":
+            if hdu_type == "events":
+                return _read_table_fitsio(filename, hdu=kwargs["hdu"], columns=columns)
+            if hdu_type == "primary":
+                import fitsio
+
+                return fits.PrimaryHDU(
+                    header=_fitsio_to_header(fitsio.read_header(str(filename), ext=0))
+                )
         if hdu_type == "events":
-            return Table.read(filename, **kwargs)
+            kwargs.setdefault("memmap", True)
+            kwargs.setdefault("character_as_bytes", True)
+            # Masking invalid values or stripping strings copies the columns
+            kwargs.setdefault("mask_invalid", False)
+            kwargs.setdefault("strip_spaces", False)
+            table = Table.read(filename, **kwargs)
+            if columns is not None:
+                table.keep_columns(columns)
+            return table
         if hdu_type == "primary":
-            return fits.PrimaryHDU.readfrom(filename, **kwargs)
+            if isinstance(filename, fits.HDUList):
+                return filename[0]
+            return fits.PrimaryHDU(header=fits.getheader(filename, ext=0))
 
 
 class FermiSpacecraft:
@@ -87,12 +375,10 @@ class FermiSpacecraft:
         Path to the spacecraft file
     """
 
+    __slots__ = ("_filename",)
+
     def __init__(self, filename):
-        filename_path = make_path(filename)
-        if os.path.isfile(filename_path):
-            self._filename = filename_path
-        else:
-            raise FileNotFoundError(f"{filename} is not a path to a file.")
+        self._filename = make_file_path(filename)
 
     @property
     def filename(self):
@@ -112,6 +398,8 @@ class FermiObservation:
         Spacecraft file
     """
 
+    __slots__ = ("_fermi_events", "_fermi_spacecraft")
+
     def __init__(self, fermi_events, fermi_spacecraft):
         if not isinstance(fermi_events, FermiEvents):
             raise TypeError(
@@ -155,20 +443,46 @@ class FermiObservations(collections.abc.MutableSequence):
             raise TypeError(f"Invalid type: {type(obs)!r}")
 
     def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return self._observations[key]
         return self._observations[self.index(key)]
 
     def __setitem__(self, key, obs):
         if isinstance(obs, FermiObservation):
-            self._observations[self.index(key)] = obs
+            if not isinstance(key, (int, slice)):
+                key = self.index(key)
+            self._observations[key] = obs
         else:
             raise TypeError(f"Invalid type: {type(obs)!r}")
 
     def __delitem__(self, key):
-        del self._observations[self.index(key)]
+        if not isinstance(key, (int, slice)):
+            key = self.index(key)
+        del self._observations[key]
 
     def __len__(self):
         return len(self._observations)
 
+    def __iter__(self):
+        return iter(self._observations)
+
+    @property
+    def events_filenames(self):
+        """List of the events file paths, in observation order"""
+        return [obs.fermi_events.filename for obs in self._observations]
+
+    @property
+    def spacecraft_filenames(self):
+        """List of the spacecraft file paths, in observation order"""
+        return [obs.fermi_spacecraft.filename for obs in self._observations]
+
+    def extend(self, observations):
+        observations = list(observations)
+        for obs in observations:
+            if not isinstance(obs, FermiObservation):
+                raise TypeError(f"Invalid type: {type(obs)!r}")
+        self._observations.extend(observations)
+
     def index(self, key):
         if isinstance(key, (int, slice)):
             return key
@@ -177,6 +491,82 @@ class FermiObservations(collections.abc.MutableSequence):
         else:
             raise TypeError(f"Invalid type: {type(key)!r}")
 
+    @staticmethod
+    def aggregate(events_files, filename, overwrite=False):
+        """Write several events files as successive extensions of a single FITS file
+
+        Reading one large file is much cheaper than reading many small ones, where header parsing
+        dominates. Each EVENTS HDU is written with its original EXTNAME and an increasing EXTVER, and
+        the number of events extensions is stored in the primary header. Use `from_aggregated` to
+        create one observation per extension of such a file.
+
+        Parameters
+        ----------
+        events_files : list of str
+            List of path to events files
+        filename : str
+            Path to the aggregated output file
+        overwrite : bool
+            Whether to overwrite ``filename`` if it exists. Default is False.
+        """
+        if isinstance(events_files, str):
+            events_files = [events_files]
+
+        with ExitStack() as stack:
+            inputs = [
+                stack.enter_context(fits.open(make_path(ev_file), memmap=True))
+                for ev_file in events_files
+            ]
+            primary_hdu = fits.PrimaryHDU(header=inputs[0][0].header.copy())
+            primary_hdu.header[_AGGREGATED_KEYWORD] = (
+                len(inputs),
+                "Number of aggregated EVENTS extensions",
+            )
+            hdus = [primary_hdu]
+            for extver, hdulist in enumerate(inputs, start=1):
+                events_hdu = hdulist["EVENTS"]
+                hdu = fits.BinTableHDU(
+                    data=events_hdu.data, header=events_hdu.header.copy()
+                )
+                hdu.header["EXTVER"] = extver
+                hdus.append(hdu)
+            fits.HDUList(hdus).writeto(make_path(filename), overwrite=overwrite)
+
+    @classmethod
+    def from_aggregated(cls, filename, spacecraft_file):
+        """Create a FermiObservations object from a file written by `aggregate`
+
+        Parameters
+        ----------
+        filename : str
+            Path to the aggregated events file
+        spacecraft_file : str
+            Path to the spacecraft file, associated with every events extension
+
+        Returns
+        -------
+        observations : `FermiObservations`
+            One observation per events extension of the file.
+        """
+        n_events = fits.getheader(make_file_path(filename), ext=0).get(
+            _AGGREGATED_KEYWORD
+        )
+        if n_events is None:
+            raise ValueError(
+                f"{filename} is not an aggregated events file, {_AGGREGATED_KEYWORD} "
+                "is missing from its primary header"
+            )
+        fermi_spacecraft = FermiSpacecraft(spacecraft_file)
+        return cls(
+            observations=[
+                FermiObservation(
+                    fermi_events=FermiEvents(filename, hdu=hdu),
+                    fermi_spacecraft=fermi_spacecraft,
+                )
+                for hdu in range(1, n_events + 1)
+            ]
+        )
+
     @classmethod
     def from_files(cls, events_files, spacecrafts_files):
         """Create a FermiObservations object from a list of events files and spacecraft files
@@ -193,29 +583,35 @@ class FermiObservations(collections.abc.MutableSequence):
             events file in events_files
         """
 
-        observations = []
         if isinstance(spacecrafts_files, str):
             spacecrafts_files = [spacecrafts_files]
         if isinstance(events_files, str):
             events_files = [events_files]
 
-        if len(events_files) == len(spacecrafts_files):
-            pass
-        elif len(spacecrafts_files) == 1:
-            spacecrafts_files = spacecrafts_files * len(events_files)
-            log.info(
-                f"Using {spacecrafts_files} of every events files in {events_files}"
-            )
-        else:
+        if len(spacecrafts_files) not in (1, len(events_files)):
             raise ValueError(
                 "spacecraft_files must be either a list of the same length as events_file or of length one"
             )
 
-        for ev_file, sp_file in zip(events_files, spacecrafts_files):
-            events = FermiEvents(ev_file)
-            spacecraft = FermiSpacecraft(sp_file)
-            observations.append(
-                FermiObservation(fermi_events=events, fermi_spacecraft=spacecraft)
+        spacecrafts = {
+            sp_file: FermiSpacecraft(sp_file) for sp_file in set(spacecrafts_files)
+        }
+
+        if len(spacecrafts_files) != len(events_files):
+            log.info(
+                f"Using {spacecrafts_files[0]} for every events files in {events_files}"
+            )
+            spacecrafts_files = itertools.repeat(spacecrafts_files[0])
+
+        def build_observation(ev_file, sp_file):
+            return FermiObservation(
+                fermi_events=FermiEvents(ev_file), fermi_spacecraft=spacecrafts[sp_file]
+            )
+
+        # File checks are I/O bound, threads overlap them
+        with ThreadPoolExecutor(max_workers=min(32, len(events_files) or 1)) as ex:
+            observations = list(
+                ex.map(build_observation, events_files, spacecrafts_files)
             )
 
         return FermiObservations(observations=observations)
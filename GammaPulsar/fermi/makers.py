@@ -1,18 +1,57 @@
+import io
 import logging as log
+import operator
 import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import numpy as np
 from astropy.io import fits
 from astropy.time import Time
 import pint
 from gammapy.utils.scripts import make_path
-from pint import models, toa
-from pint.fermi_toas import load_Fermi_TOAs
+from pint import toa
+from pint.fits_utils import read_fits_event_mjds_tuples
 from pint.observatory.satellite_obs import get_satellite_observatory
 from GammaPulsar.fermi import FermiObservation
-from GammaPulsar.utils import EphemerisKeyNotFound
+from GammaPulsar.fermi.data import _close_hdulists
+from GammaPulsar.utils import (
+    EphemerisKeyNotFound,
+    get_timing_model,
+    load_fermi_toas,
+    make_file_path,
+)
 
 __all__ = ["FermiPhaseMaker"]
 
+KEY_MODEL = (
+    "PSR",
+    "START",
+    "FINISH",
+    "TZRMJD",
+    "TZRSITE",
+    "TZRFREQ",
+    "EPHEM",
+    "RAJ",
+    "DECJ",
+)
+
+META_PREFIX = "PHSE"
+
+_MISSING = object()
+
+_get_model_keys = operator.attrgetter(*KEY_MODEL)
+
+_TIME_KEYWORDS = ("MJDREF", "MJDREFI", "MJDREFF", "TIMEZERO", "TIMEZERI", "TIMEZERF")
+
+
+def _compute_and_write(observation, ephemeris_file, filename, write_kwargs, kwargs):
+    """Compute and write the phase of one observation, used by `FermiPhaseMaker.run_many`"""
+    maker = FermiPhaseMaker(observation, ephemeris_file, **kwargs)
+    maker.compute_phase()
+    maker.write_column_and_meta(filename=filename, **write_kwargs)
+    return make_path(filename or observation.fermi_events.filename)
+
 
 class FermiPhaseMaker:
     """
@@ -57,41 +96,66 @@ class FermiPhaseMaker:
 
         if not isinstance(observation, FermiObservation):
             raise TypeError("observation must be instance of FermiObservation")
-        ephemeris_file_path = make_path(ephemeris_file)
-        if os.path.isfile(ephemeris_file_path):
-            self.ephemeris_file = ephemeris_file_path
-        else:
-            raise FileNotFoundError(f"{ephemeris_file} is not a path to a file.")
+        # PINT reads, and write_column_and_meta writes, the first extension of the events file
+        if observation.fermi_events.hdu not in ("EVENTS", 1):
+            raise ValueError(
+                "FermiPhaseMaker only supports events in the first extension of the events file, "
+                f"got hdu={observation.fermi_events.hdu}"
+            )
+        self.ephemeris_file = make_file_path(ephemeris_file)
         self.observation = observation
-        self.model = models.get_model(ephemeris_file_path)
+        self.model = get_timing_model(self.ephemeris_file)
         self.ephem = ephem
         self.include_bipm = include_bipm
         self.include_gps = include_gps
         self.planets = planets
         self.phases = None
+        self.rows = slice(None)
         self.weightcolumn = weightcolumn
         self.targetcoord = targetcoord
 
-    def compute_phase(self, **kwargs):
+    def compute_phase(self, tmin=None, tmax=None, **kwargs):
         """
         Compute the pulsar phase.
 
         Parameters
         ----------
+        tmin : float or None
+            If given, only compute the phase of events with a ``TIME`` greater or equal to `tmin`,
+            in mission elapsed time (s). Default is None.
+        tmax : float or None
+            If given, only compute the phase of events with a ``TIME`` lower than `tmax`, in
+            mission elapsed time (s). Default is None.
         **kwargs : dict
             Keyword arguments to pass to `pint.fermi_toas.load_Fermi_TOAs` .
         """
+        self.rows = slice(None)
+        if tmin is not None or tmax is not None:
+            self.rows = self.observation.fermi_events.time_rows(tmin=tmin, tmax=tmax)
+            if self.rows.start == self.rows.stop:
+                raise ValueError(f"No events between tmin={tmin} and tmax={tmax}")
+            kwargs["minmjd"], kwargs["maxmjd"] = self._mjd_bounds(
+                self.observation.fermi_events, self.rows
+            )
 
         get_satellite_observatory(
             "Fermi", self.observation.fermi_spacecraft.filename, overwrite=True
         )
 
-        toa_list = load_Fermi_TOAs(
+        toa_list = load_fermi_toas(
             ft1name=self.observation.fermi_events.filename,
             weightcolumn=self.weightcolumn,
             targetcoord=self.targetcoord,
             **kwargs,
         )
+        # A mismatch would otherwise only show when writing the phases
+        if self.rows != slice(None):
+            n_rows = self.rows.stop - self.rows.start
+            if len(toa_list) != n_rows:
+                raise ValueError(
+                    f"{len(toa_list)} TOAs were loaded for the {n_rows} events between "
+                    f"tmin={tmin} and tmax={tmax}"
+                )
 
         ts = toa.get_TOAs_list(
             toa_list=toa_list,
@@ -101,8 +165,117 @@ class FermiPhaseMaker:
             planets=self.planets,
         )
 
-        phases = self.model.phase(toas=ts, abs_phase=True)[1]
-        self.phases = np.where(phases < 0.0, phases + 1.0, phases)
+        # PINT returns extended precision, the phases are stored as float64 anyway
+        phases = np.asarray(self.model.phase(toas=ts, abs_phase=True)[1]).astype(
+            np.float64, copy=False
+        )
+        np.mod(phases, 1.0, out=phases)
+        self.phases = phases
+
+    @staticmethod
+    def _mjd_bounds(events, rows):
+        """
+        MJD bounds selecting exactly `rows` of `events` in `pint.fermi_toas.load_Fermi_TOAs`.
+
+        The bounds are taken halfway between the first (last) event of `rows` and the event before
+        (after) it, so that rounding in the MET to MJD conversion can not move an event across them.
+
+        Parameters
+        ----------
+        events : `GammaPulsar.fermi.FermiEvents`
+            The events.
+        rows : slice
+            Slice of the rows, as returned by `GammaPulsar.fermi.FermiEvents.time_rows`.
+
+        Returns
+        -------
+        minmjd, maxmjd : float
+            The MJD bounds.
+        """
+        bounds = [-np.inf, np.inf]
+        midpoints = {}
+        if rows.start > 0:
+            time = events.read_rows(rows.start - 1, rows.start + 1, columns=["TIME"])
+            midpoints[0] = time["TIME"].mean()
+        time = events.read_rows(rows.stop - 1, rows.stop + 1, columns=["TIME"])
+        if len(time) == 2:
+            midpoints[1] = time["TIME"].mean()
+        if midpoints:
+            # Convert with PINT's own MET to MJD conversion, MJDREF and TIMEZERO included
+            header = fits.Header(
+                [
+                    (key, value)
+                    for key, value in events.table.meta.items()
+                    if key in _TIME_KEYWORDS
+                ]
+            )
+            hdu = fits.BinTableHDU.from_columns(
+                [fits.Column(name="TIME", format="D", array=list(midpoints.values()))],
+                header=header,
+            )
+            mjds = read_fits_event_mjds_tuples(hdu)
+            for idx, mjd in zip(midpoints, mjds):
+                bounds[idx] = mjd[0] + mjd[1]
+        return tuple(bounds)
+
+    @classmethod
+    def run_many(
+        cls,
+        observations,
+        ephemeris_file,
+        filenames=None,
+        column_name="PULSE_PHASE",
+        overwrite=True,
+        workers=None,
+        **kwargs,
+    ):
+        """
+        Compute and write the pulsar phase of several observations in parallel.
+
+        Each observation is processed independently in its own process, the PINT phase computation
+        being CPU bound.
+
+        Parameters
+        ----------
+        observations : `GammaPulsar.fermi.FermiObservations` or list of `GammaPulsar.fermi.FermiObservation`
+            The Fermi-LAT observations to compute the phase for.
+        ephemeris_file : str
+            Path to the ephemeris file to use for the pulsar phase computation
+        filenames : list of str or None
+            The paths to write each observation to, see `write_column_and_meta`. Default is None, which
+            writes the column in the original Fermi-LAT events files.
+        column_name : str
+            The name of the column created to write the pulsar phase. Default is PULSE_PHASE.
+        overwrite : bool
+            Whether to overwrite the column if a column with the same name already exist in the file.
+        workers : int or None
+            Number of worker processes. Default is None, which uses `os.cpu_count()`.
+        **kwargs : dict
+            Keyword arguments to pass to `FermiPhaseMaker` .
+
+        Returns
+        -------
+        filenames : list of `pathlib.Path`
+            The paths of the written files, in the order of `observations`.
+        """
+        observations = list(observations)
+        if filenames is None:
+            filenames = [None] * len(observations)
+        if len(filenames) != len(observations):
+            raise ValueError("filenames must be of the same length as observations")
+        write_kwargs = dict(column_name=column_name, overwrite=overwrite)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(
+                executor.map(
+                    _compute_and_write,
+                    observations,
+                    repeat(ephemeris_file),
+                    filenames,
+                    repeat(write_kwargs),
+                    repeat(kwargs),
+                )
+            )
 
     def write_column_and_meta(
         self, filename=None, column_name="PULSE_PHASE", overwrite=True
@@ -122,55 +295,91 @@ class FermiPhaseMaker:
             standard of Fermi-LAT analysis.
         overwrite : bool
             Whether to overwrite the column if a column with the same name already exist in the file.
+
+        Notes
+        -----
+        If the phase was computed on a time range, see `compute_phase`, only the rows of this range
+        are written. The other rows of a new column are set to NaN.
         """
+        events_filename = self.observation.fermi_events.filename
         if filename is None:
-            hdulist = fits.open(self.observation.fermi_events.filename, mode="update")
-        else:
-            hdulist = fits.open(self.observation.fermi_events.filename)
+            filename = events_filename
 
-        event_hdu = hdulist[1]
-        event_header = event_hdu.header
-        event_data = event_hdu
+        with fits.open(events_filename, memmap=True) as hdulist:
 
-        is_check = self._check_column_name(event_hdu=event_hdu, column_name=column_name)
+            event_hdu = hdulist[1]
+            event_header = event_hdu.header
 
-        if is_check:
-
-            phasecol = fits.ColDefs(
-                [fits.Column(name=column_name, format="D", array=self.phases)]
-            )
-            event_header["PHSE_LOG"] = self._make_meta(
-                self.ephemeris_file, self.model, column_name=column_name
+            is_check = self._check_column_name(
+                event_hdu=event_hdu, column_name=column_name
             )
-            bin_table = fits.BinTableHDU.from_columns(
-                event_hdu.columns + phasecol, header=event_header, name=event_hdu.name
+            if not is_check and not overwrite:
+                raise ValueError(
+                    f"Column named {column_name} already exist in file {events_filename}"
+                    f"and overwrite is set to {overwrite}."
+                )
+
+            self._write_meta(
+                event_header,
+                self._make_meta(
+                    self.ephemeris_file, self.model, column_name=column_name
+                ),
             )
-            hdulist[1] = bin_table
+            if is_check:
+                if self.rows == slice(None):
+                    phases = np.asarray(self.phases, dtype=np.float64)
+                else:
+                    phases = np.full(len(event_hdu.data), np.nan)
+                    phases[self.rows] = self.phases
+                phasecol = fits.ColDefs(
+                    [fits.Column(name=column_name, format="D", array=phases)]
+                )
+                hdulist[1] = fits.BinTableHDU.from_columns(
+                    event_hdu.columns + phasecol,
+                    header=event_header,
+                    name=event_hdu.name,
+                )
+            else:
+                event_hdu.data[column_name][self.rows] = self.phases
 
-        elif not is_check and overwrite:
+            buffer = io.BytesIO()
+            hdulist.writeto(buffer, checksum=True, output_verify="warn")
 
-            event_data.data[column_name] = self.phases
-            event_header["PHSE_LOG"] = self._make_meta(
-                self.ephemeris_file, self.model, column_name=column_name
-            )
+        self._write_buffer(buffer, filename)
+        # The cached HDUList of the replaced file would keep its old version open
+        _close_hdulists(filename)
 
-        elif not is_check and not overwrite:
-            raise ValueError(
-                f"Column named {column_name} already exist in file {self.observation.fermi_events.filename}"
-                f"and overwrite is set to {overwrite}."
-            )
+    @staticmethod
+    def _write_buffer(buffer, filename):
+        """
+        Write the content of a buffer to a file with a single write call.
 
-        if filename is None:
-            hdulist.flush(verbose=True, output_verify="warn")
-        else:
-            hdulist.writeto(
-                filename, overwrite=True, checksum=True, output_verify="warn"
-            )
+        The buffer is written to a temporary file in the same directory which then replaces
+        `filename`, so the file is never left partially written.
+
+        Parameters
+        ----------
+        buffer : `io.BytesIO`
+            The buffer to write.
+        filename : str
+            The path to the file to write.
+        """
+        filename = make_path(filename)
+        tmp_filename = filename.with_name(f".{filename.name}.tmp")
+        try:
+            with open(tmp_filename, "wb") as stream:
+                stream.write(buffer.getbuffer())
+            if filename.exists():
+                shutil.copymode(filename, tmp_filename)
+            os.replace(tmp_filename, filename)
+        finally:
+            if tmp_filename.exists():
+                tmp_filename.unlink()
 
     @staticmethod
     def _make_meta(ephemeris_file, model, column_name="PULSE_PHASE", offset=None):
         """
-        Make the metadata string to put in the header of the Fermi-LAT events file.
+        Make the metadata to put in the header of the Fermi-LAT events file.
 
         Parameters
         ----------
@@ -184,41 +393,72 @@ class FermiPhaseMaker:
             The offset that was applied to the pulsar phase. Default is None.
         Returns
         -------
-        str(meta_dict) : str
-            The string of the dictionary that is build from the different metadata gather for the pulsar phase
-            computation?
-        """
-
-        key_model = [
-            "PSR",
-            "START",
-            "FINISH",
-            "TZRMJD",
-            "TZRSITE",
-            "TZRFREQ",
-            "EPHEM",
-            "RAJ",
-            "DECJ",
-        ]
+        meta_dict : dict
+            The dictionary that is build from the different metadata gather for the pulsar phase
+            computation.
+        """
 
         meta_dict = dict()
         meta_dict["COLUMN_NAME"] = column_name
         meta_dict["EPHEMERIS_FILE"] = str(ephemeris_file)
         meta_dict["PINT_VERS"] = pint.__version__
 
-        for key in key_model:
-            try:
-                meta_dict[key] = getattr(model, key).value
-            except AttributeError:
+        try:
+            params = _get_model_keys(model)
+        except AttributeError:
+            params = [getattr(model, key, _MISSING) for key in KEY_MODEL]
+        for key, param in zip(KEY_MODEL, params):
+            if param is _MISSING:
                 print(
                     EphemerisKeyNotFound(key=key, ephemeris_file=ephemeris_file).message
                 )
                 meta_dict[key] = None
+            else:
+                meta_dict[key] = param.value
 
         meta_dict["PHASE_OFFSET"] = offset
         meta_dict["DATE"] = Time.now().mjd
 
-        return str(meta_dict)
+        return meta_dict
+
+    @staticmethod
+    def _write_meta(header, meta_dict):
+        """
+        Write the metadata in a FITS header, as one ``HIERARCH PHSE <key>`` card per entry.
+
+        Parameters
+        ----------
+        header : `astropy.io.fits.Header`
+            The header to write the metadata to.
+        meta_dict : dict
+            The metadata, as returned by `_make_meta`.
+        """
+        for key, value in meta_dict.items():
+            header[f"HIERARCH {META_PREFIX} {key}"] = value
+
+    @staticmethod
+    def read_meta(header):
+        """
+        Read the phase metadata written by `write_column_and_meta` from a FITS header.
+
+        Parameters
+        ----------
+        header : `astropy.io.fits.Header`
+            The header of the events HDU.
+
+        Returns
+        -------
+        meta_dict : dict
+            The phase metadata.
+        """
+        prefix = f"{META_PREFIX} "
+        return {
+            card.keyword[len(prefix) :]: (
+                None if isinstance(card.value, fits.card.Undefined) else card.value
+            )
+            for card in header.cards
+            if card.keyword.startswith(prefix)
+        }
 
     @staticmethod
     def _check_column_name(event_hdu, column_name):
@@ -238,11 +478,9 @@ class FermiPhaseMaker:
         check : bool
             Whether the check passed.
         """
-        if column_name not in event_hdu.columns.names:
-            log.info(f"Writing {column_name} to events file")
-            return True
+        exists = column_name in event_hdu.columns.names
+        if exists:
+            log.info(f"Column named {column_name} found in events file")
         else:
-            log.info(
-                f"Column named {column_name} found in events file, overwriting it !"
-            )
-            return False
+            log.info(f"Writing {column_name} to events file")
+        return not exists
@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 import pytest
+from numpy.testing import assert_allclose
+import astropy.units as u
 from astropy.io import fits
 from astropy.table import Table
 from gammapy.utils.scripts import make_path
@@ -38,15 +40,140 @@ class TestFermiEvents:
         assert isinstance(hdu_events, Table)
         assert isinstance(hdu_primary, fits.PrimaryHDU)
 
+    def test_load_file_fitsio(self):
+        pytest.importorskip("fitsio")
+        table_astropy = self.events._load_file(self.events.filename, hdu_type="events")
+        table_fitsio = self.events._load_file(
+            self.events.filename, hdu_type="events", backend="fitsio"
+        )
+        hdu_primary = self.events._load_file(
+            self.events.filename, hdu_type="primary", backend="fitsio"
+        )
+
+        assert isinstance(table_fitsio, Table)
+        assert table_fitsio.colnames == table_astropy.colnames
+        assert len(table_fitsio) == len(table_astropy)
+        assert table_fitsio["ENERGY"].unit == table_astropy["ENERGY"].unit
+        assert table_fitsio.meta["DSVAL3"] == table_astropy.meta["DSVAL3"]
+        assert isinstance(hdu_primary, fits.PrimaryHDU)
+
+    def test_load_file_invalid_backend(self):
+        with pytest.raises(ValueError):
+            self.events._load_file(self.events.filename, backend="cfitsio")
+
     def test_table(self):
 
         assert isinstance(self.events.table, Table)
         assert self.events.table is not None
 
+    def test_table_columns(self):
+        events = FermiEvents(
+            filename="$GAMMAPULSAR_DATA/fermi/vela_2days/vela_2days_events.fits",
+            columns=["TIME", "ENERGY"],
+        )
+
+        assert set(events.table.colnames) == {"TIME", "ENERGY"}
+
+    def test_read_rows(self):
+        rows = self.events.read_rows(10, 20, columns=["TIME", "ENERGY"])
+
+        assert len(rows) == 10
+        assert set(rows.dtype.names) == {"TIME", "ENERGY"}
+        assert_allclose(rows["TIME"], self.events.table["TIME"][10:20])
+
+    def test_time_rows(self):
+        time = self.events.table["TIME"]
+        rows = self.events.time_rows(tmin=time[10], tmax=time[20])
+
+        assert rows == slice(10, 20)
+        assert self.events.time_rows() == slice(0, len(time))
+
+    def test_primary_header(self):
+
+        assert isinstance(self.events.primary_header, fits.Header)
+        assert self.events.primary_header["SIMPLE"]
+
     def test_primary(self):
 
-        assert isinstance(self.events.primary_hdu, fits.PrimaryHDU)
-        assert self.events.primary_hdu is not None
+        with pytest.warns(DeprecationWarning):
+            primary_hdu = self.events.primary_hdu
+
+        assert isinstance(primary_hdu, fits.PrimaryHDU)
+
+
+def test_fermi_events_context_manager():
+    with FermiEvents(
+        filename="$GAMMAPULSAR_DATA/fermi/vela_2days/vela_2days_events.fits"
+    ) as events:
+        assert isinstance(events.table, Table)
+        assert isinstance(events.primary_header, fits.Header)
+        assert events._hdulist is not None
+
+    assert events._hdulist is None
+
+
+def test_fermi_events_column_str(tmp_path):
+    filename = tmp_path / "events.fits"
+    Table({"TIME": [1.0, 2.0], "CLASS": ["ab", "cd"]}).write(filename, format="fits")
+    events = FermiEvents(filename=filename, hdu=1)
+
+    assert events.table["CLASS"].dtype.kind == "S"
+    assert list(events.column_str("CLASS")) == ["ab", "cd"]
+    assert list(events.column_str("TIME")) == [1.0, 2.0]
+
+
+def test_fermi_events_column_str_fitsio(tmp_path, monkeypatch):
+    pytest.importorskip("fitsio")
+    monkeypatch.setenv("GAMMAPULSAR_FITS_BACKEND", "fitsio")
+    filename = tmp_path / "events.fits"
+    Table({"TIME": [1.0, 2.0], "CLASS": ["ab", "cd"]}).write(filename, format="fits")
+    events = FermiEvents(filename=filename, hdu=1)
+
+    assert events.table["CLASS"].dtype.kind == "S"
+    assert list(events.column_str("CLASS")) == ["ab", "cd"]
+
+
+def test_load_file_fitsio_long_value(tmp_path):
+    pytest.importorskip("fitsio")
+    filename = tmp_path / "events.fits"
+    long_value = "/tmp/" + "a_rather_long_directory_name_for_pulsars/" * 3 + "vela.par"
+    hdu = fits.BinTableHDU(Table({"TIME": [1.0, 2.0]}), name="EVENTS")
+    hdu.header["HIERARCH PHSE EPHEMERIS_FILE"] = long_value
+    hdu.header["LONGSTR"] = ("y" * 100, "a comment")
+    fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(filename)
+
+    table = FermiEvents._load_file(filename, hdu_type="events", backend="fitsio")
+
+    assert table.meta["PHSE EPHEMERIS_FILE"] == long_value
+    assert table.meta["LONGSTR"] == "y" * 100
+
+
+@pytest.mark.parametrize("backend", ["astropy", "fitsio"])
+def test_load_file_malformed_unit(tmp_path, backend):
+    if backend == "fitsio":
+        pytest.importorskip("fitsio")
+    filename = tmp_path / "events.fits"
+    column = fits.Column(name="ENERGY", format="D", array=[1.0], unit="MeVz")
+    hdu = fits.BinTableHDU.from_columns([column], name="EVENTS")
+    fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(filename)
+
+    with pytest.warns(u.UnitsWarning):
+        table = FermiEvents._load_file(filename, hdu_type="events", backend=backend)
+
+    assert isinstance(table["ENERGY"].unit, u.UnrecognizedUnit)
+
+
+def test_fermi_events_shared_file():
+    filename = "$GAMMAPULSAR_DATA/fermi/vela_2days/vela_2days_events.fits"
+    events_1 = FermiEvents(filename=filename)
+    events_2 = FermiEvents(filename=filename)
+
+    assert len(events_1.table) == len(events_2.table)
+    assert events_1._hdulist is events_2._hdulist
+
+    FermiEvents.clear_cache()
+
+    assert isinstance(FermiEvents(filename=filename).primary_header, fits.Header)
 
 
 class TestFermiSpacecraft:
@@ -112,3 +239,25 @@ def test_observations_from_files():
 
     assert isinstance(obs_str_both[0], FermiObservation)
     assert isinstance(obs_str_both[0].fermi_events, FermiEvents)
+
+    assert obs_list_only_ev.events_filenames == [make_path(event)] * 2
+    assert obs_list_only_ev.spacecraft_filenames == [make_path(spacecraft)] * 2
+
+
+def test_observations_aggregate(tmp_path):
+
+    event = "$GAMMAPULSAR_DATA/fermi/vela_2days/vela_2days_events.fits"
+    spacecraft = "$GAMMAPULSAR_DATA/fermi/vela_2days/vela_2days_spacecraft.fits"
+    filename = tmp_path / "aggregated_events.fits"
+
+    FermiObservations.aggregate(events_files=[event, event], filename=filename)
+    observations = FermiObservations.from_aggregated(
+        filename=str(filename), spacecraft_file=spacecraft
+    )
+
+    with pytest.raises(ValueError):
+        FermiObservations.from_aggregated(filename=event, spacecraft_file=spacecraft)
+
+    assert len(observations) == 2
+    assert observations[0].fermi_events.filename == filename
+    assert len(observations[1].fermi_events.table) == len(FermiEvents(event).table)
@@ -4,7 +4,6 @@ import pytest
 from numpy.testing import assert_allclose
 from astropy.coordinates import SkyCoord
 from astropy.io import fits
-from astropy.time import Time
 import pint
 from gammapy.utils.scripts import make_path
 from pint.models import TimingModel
@@ -31,6 +30,22 @@ def targetcoord():
     return SkyCoord("128.83606354", "-45.17643181", unit="deg", frame="icrs")
 
 
+def test_init_fermi_phase_maker_aggregated(fermi_observation, ephemeris, tmp_path):
+    filename = tmp_path / "aggregated_events.fits"
+    FermiObservations.aggregate(
+        events_files=[fermi_observation[0].fermi_events.filename] * 2,
+        filename=filename,
+    )
+    observations = FermiObservations.from_aggregated(
+        filename=filename,
+        spacecraft_file=fermi_observation[0].fermi_spacecraft.filename,
+    )
+
+    FermiPhaseMaker(observations[0], ephemeris)
+    with pytest.raises(ValueError):
+        FermiPhaseMaker(observations[1], ephemeris)
+
+
 def test_init_fermi_phase_maker(fermi_observation, ephemeris):
     obs = fermi_observation
     ephemeris = ephemeris
@@ -77,13 +92,27 @@ class TestFermiPhaseMaker:
         assert self.maker2.phases is not None
         assert_allclose(self.maker2.phases.sum(), 2276.69356911)
 
-    def test_make_meta(self):
+    @disable_logging_library(name="pint")
+    def test_compute_phase_time_range(self):
+        time = self.maker1.observation.fermi_events.table["TIME"]
+        self.maker1.compute_phase()
+        phases = self.maker1.phases
+
+        self.maker1.compute_phase(tmin=time[100], tmax=time[200])
 
-        meta_str = self.maker1._make_meta(self.maker1.ephemeris_file, self.maker1.model)
+        assert self.maker1.rows == slice(100, 200)
+        assert_allclose(self.maker1.phases, phases[100:200])
+
+        with pytest.raises(ValueError):
+            self.maker1.compute_phase(tmin=time[100], tmax=time[100])
 
-        assert isinstance(meta_str, str)
+    def test_make_meta(self):
+
+        meta_dict = self.maker1._make_meta(
+            self.maker1.ephemeris_file, self.maker1.model
+        )
 
-        meta_dict = eval(meta_str)
+        assert isinstance(meta_dict, dict)
 
         check_dict = {
             "COLUMN_NAME": "PULSE_PHASE",
@@ -99,23 +128,24 @@ class TestFermiPhaseMaker:
             "RAJ": 8.589058747222223,
             "DECJ": -45.17635419444444,
             "PHASE_OFFSET": None,
-            "DATE": Time.now().mjd,
         }
 
-        for k in {k: v for k, v in meta_dict.items() if k not in ["DATE"]}.keys():
-            assert meta_dict[k] == check_dict[k]
+        assert "DATE" in meta_dict
+        assert {k: v for k, v in meta_dict.items() if k != "DATE"} == check_dict
 
     def test_check_column_name(self):
 
-        hdulist = fits.open(self.maker1.observation.fermi_events.filename)
-        event_hdu = hdulist[1]
+        with fits.open(
+            self.maker1.observation.fermi_events.filename, memmap=True
+        ) as hdulist:
+            event_hdu = hdulist[1]
 
-        check_pulse_overwrite = self.maker1._check_column_name(
-            event_hdu=event_hdu, column_name="PULSE_PHASE"
-        )
-        check_energy_overwrite = self.maker1._check_column_name(
-            event_hdu=event_hdu, column_name="ENERGY"
-        )
+            check_pulse_overwrite = self.maker1._check_column_name(
+                event_hdu=event_hdu, column_name="PULSE_PHASE"
+            )
+            check_energy_overwrite = self.maker1._check_column_name(
+                event_hdu=event_hdu, column_name="ENERGY"
+            )
 
         assert check_pulse_overwrite is True
         assert check_energy_overwrite is False
@@ -136,9 +166,28 @@ class TestFermiPhaseMaker:
         header = event_hdu.header
 
         assert_allclose(event_hdu.data["PULSE_PHASE"].sum(), 2276.69356911)
-        assert eval(header["PHSE_LOG"])["COLUMN_NAME"] == "PULSE_PHASE"
+        meta_dict = FermiPhaseMaker.read_meta(header)
+
+        assert meta_dict["COLUMN_NAME"] == "PULSE_PHASE"
+        assert meta_dict["EPHEMERIS_FILE"] == str(self.maker1.ephemeris_file)
 
         with pytest.raises(ValueError):
             self.maker1.write_column_and_meta(
                 filename=filename, column_name="ENERGY", overwrite=False
             )
+
+
+def test_run_many(fermi_observation, ephemeris, tmp_path):
+
+    filenames = [tmp_path / "run_many_fermi_phase_maker.fits"]
+
+    written = FermiPhaseMaker.run_many(
+        fermi_observation, ephemeris, filenames=filenames, workers=1
+    )
+
+    assert written == filenames
+    with fits.open(filenames[0]) as hdulist:
+        assert_allclose(hdulist[1].data["PULSE_PHASE"].sum(), 2276.69356911)
+
+    with pytest.raises(ValueError):
+        FermiPhaseMaker.run_many(fermi_observation, ephemeris, filenames=[])
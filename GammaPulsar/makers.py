@@ -1,17 +1,51 @@
+import copy
 import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
 import numpy as np
 import astropy.units as u
+from astropy.table import Column
 from gammapy.data import EventList
+from gammapy.utils.scripts import make_path
 from loguru import logger as log
-from pint import models, toa
-from pint.fermi_toas import load_Fermi_TOAs
+from pint import toa
+from pint.observatory import get_observatory
 from pint.observatory.satellite_obs import get_satellite_observatory
 from GammaPulsar.data import FermiObservation
+from GammaPulsar.utils import get_timing_model, load_fermi_toas
 
 __all__ = ["PhaseMaker", "FermiPhaseMaker", "FermiBinnedConfigMaker"]
 
 
+def _use_planets(model, planets):
+    """Planet Shapiro delays are only computed if the timing model includes them"""
+    planet_shapiro = getattr(model, "PLANET_SHAPIRO", None)
+    return bool(planets and planet_shapiro is not None and planet_shapiro.value)
+
+
+# Spacecraft file (path, mtime) and observatory last loaded for each satellite observatory
+_SAT_OBS_CACHE = {}
+
+
+def _load_satellite_observatory(name, ft2_file):
+    path = os.path.abspath(make_path(ft2_file))
+    key = (path, os.path.getmtime(path))
+    cached_key, cached_obs = _SAT_OBS_CACHE.get(name, (None, None))
+    # The observatory may have been registered again by other code since it was cached
+    if cached_key == key and _get_registered_observatory(name) is cached_obs:
+        return
+    obs = get_satellite_observatory(name, path, overwrite=True)
+    _SAT_OBS_CACHE[name] = (key, obs)
+
+
+def _get_registered_observatory(name):
+    try:
+        return get_observatory(name)
+    except KeyError:
+        return None
+
+
 class PhaseMaker:
     def __init__(
         self,
@@ -42,12 +76,18 @@ class PhaseMaker:
         self.phase = None
         self.error = error
         self.obs = obs
-        self.model = models.get_model(ephemeris_file)
+        self.model = get_timing_model(ephemeris_file)
         self.times = events.times
         self.ephem = ephem
         self.include_bipm = include_bipm
         self.include_gps = include_gps
-        self.planets = planets
+        self.planets = _use_planets(self.model, planets)
+        self._toa_kwargs = dict(
+            ephem=self.ephem,
+            include_bipm=self.include_bipm,
+            include_gps=self.include_gps,
+            planets=self.planets,
+        )
 
     def run(self, column_name="PHASE", overwrite=True, meta_entry="PHS_LOG"):
 
@@ -59,36 +99,28 @@ class PhaseMaker:
 
     def compute_phase(self):
 
-        toa_list = list(
-            toa.TOA(MJD=t, error=self.error * u.microsecond, obs=self.obs)
-            for t in self.times
-        )
-        ts = toa.get_TOAs_list(
-            toa_list=toa_list,
-            ephem=self.ephem,
-            include_bipm=self.include_bipm,
-            include_gps=self.include_gps,
-            planets=self.planets,
+        ts = toa.get_TOAs_array(
+            self.times,
+            obs=self.obs,
+            errors=self.error * u.microsecond,
+            **self._toa_kwargs,
         )
         phase = self.model.phase(toas=ts, abs_phase=True)[1]
-        self.phase = np.where(phase < 0.0, phase + 1.0, phase)
+        self.phase = np.mod(phase, 1.0)
 
     def add_column(self, column_name="PHASE", overwrite=True):
 
-        if overwrite:
+        if overwrite or self._check_column(
+            column_name=column_name, overwrite=overwrite
+        ):
             self.events.table[column_name] = self.phase
-        else:
-            if self._check_column(column_name=column_name, overwrite=overwrite):
-                self.events.table[column_name] = self.phase
-            else:
-                self._check_column(column_name=column_name, overwrite=overwrite)
 
     def add_meta(self, meta_entry="PHSE_LOG"):
         pass
 
     def _check_column(self, column_name, overwrite):
 
-        if self.events.table[column_name]:
+        if column_name in self.events.table.colnames:
             log.debug(
                 f"Passing {column_name} with overwrite : {overwrite}. Column name {column_name} already exist. "
                 "Aborting add_column."
@@ -111,47 +143,74 @@ class FermiPhaseMaker:
     ):
         if not isinstance(observation, FermiObservation):
             raise TypeError("observation must be instance of FermiObservation")
-        self.observation = observation.copy()
-        self.model = models.get_model(ephemeris_file)
+        # The observation is only copied when add_column first writes to it
+        self._observation_src = observation
+        self._observation = None
+        self.model = get_timing_model(ephemeris_file)
         self.ephem = ephem
         self.include_bipm = include_bipm
         self.include_gps = include_gps
-        self.planets = planets
-        self.weightcolumn = weightcolumn
-        self.phase = None
-
-    def compute_phase(self):
-
-        get_satellite_observatory(
-            "Fermi", self.observation.spacecraft.filename, overwrite=True
-        )
-
-        toa_list = load_Fermi_TOAs(
-            ft1name=self.observation.events.filename,
-            weightcolumn=self.weightcolumn,
-            targetcoord=self.observation.events.center,
-        )
-        ts = toa.get_TOAs_list(
-            toa_list=toa_list,
+        self.planets = _use_planets(self.model, planets)
+        self._toa_kwargs = dict(
             ephem=self.ephem,
             include_bipm=self.include_bipm,
             include_gps=self.include_gps,
             planets=self.planets,
         )
-        phase = self.model.phase(toas=ts, abs_phase=True)[1]
-        self.phase = np.where(phase < 0.0, phase + 1.0, phase)
+        self.weightcolumn = weightcolumn
+        self.targetcoord = None
+        if weightcolumn is not None:
+            self.targetcoord = observation.events.center
+        self.phase = None
+
+    @property
+    def observation(self):
+        if self._observation is None:
+            return self._observation_src
+        return self._observation
+
+    def compute_phase(self, chunk_size=None):
+
+        if chunk_size is not None and chunk_size <= 0:
+            raise ValueError(f"chunk_size must be a positive integer, got {chunk_size}")
+
+        _load_satellite_observatory("Fermi", self.observation.spacecraft.filename)
+
+        toa_kwargs = {"ft1name": self.observation.events.filename}
+        if self.weightcolumn is not None:
+            toa_kwargs["weightcolumn"] = self.weightcolumn
+            toa_kwargs["targetcoord"] = self.targetcoord
+        toa_list = load_fermi_toas(**toa_kwargs)
+        # The TOAs are processed by chunks of chunk_size events to cap the memory used by PINT
+        if chunk_size is None:
+            chunk_size = max(len(toa_list), 1)
+        phase = np.empty(len(toa_list), dtype=np.float64)
+        for start in range(0, len(toa_list), chunk_size):
+            ts = toa.get_TOAs_list(
+                toa_list=toa_list[start : start + chunk_size], **self._toa_kwargs
+            )
+            phase[start : start + chunk_size] = self.model.phase(
+                toas=ts, abs_phase=True
+            )[1]
+        self.phase = np.mod(phase, 1.0, out=phase)
 
     def add_column(self, column_name="PULSE_PHASE", overwrite=True):
 
-        if overwrite:
-            self.observation.events.table[column_name] = self.phase.astype("float64")
-        else:
-            if self._check_column(column_name=column_name, overwrite=overwrite):
-                self.observation.events.table[column_name] = self.phase.astype(
-                    "float64"
-                )
+        if overwrite or self._check_column(
+            column_name=column_name, overwrite=overwrite
+        ):
+            if self._observation is None:
+                self._observation = self._observation_src.copy()
+            table = self._observation.events.table
+            column = Column(
+                np.ascontiguousarray(self.phase, dtype=np.float64),
+                name=column_name,
+                copy=False,
+            )
+            if column_name in table.colnames:
+                table.replace_column(column_name, column, copy=False)
             else:
-                self._check_column(column_name=column_name, overwrite=overwrite)
+                table.add_column(column, copy=False)
 
     def add_meta(self, meta_entry="PHSE_LOG"):
         pass
@@ -166,7 +225,7 @@ class FermiPhaseMaker:
 
     def _check_column(self, column_name, overwrite):
 
-        if self.observation.events.table[column_name]:
+        if column_name in self.observation.events.table.colnames:
             log.debug(
                 f"Passing {column_name} with overwrite : {overwrite}. Column name {column_name} already exist."
                 f"Aborting add_column"
@@ -183,65 +242,51 @@ class FermiBinnedConfigMaker:
         self.axis_name = axis_name
         self.map_axis = map_axis
 
-    @staticmethod
     def _make_base_path(self, base_dir=None):
 
         if base_dir is None:
-            base_path = Path("./")
-        else:
-            if isinstance(base_dir, str):
-                base_path = Path(base_dir)
-            else:
-                base_path = base_dir
-        return base_path
+            return Path("./")
+        return Path(base_dir)
 
     @staticmethod
     def _make_dir_name(name, value_min, value_max):
 
-        if not isinstance(name, str):
-            name = str(name)
-        if not isinstance(value_min, str):
-            value_min = str(value_min)
-        if not isinstance(value_max, str):
-            value_max = str(value_max)
-
-        return Path(name + "_" + value_min + "-" + value_max)
+        return Path(f"{name}_{value_min}-{value_max}")
 
     @staticmethod
     def _make_config_name(value_min, value_max, name="config"):
 
-        if not isinstance(name, str):
-            name = str(name)
-        if not isinstance(value_min, str):
-            value_min = str(value_min)
-        if not isinstance(value_max, str):
-            value_max = str(value_max)
+        return Path(f"{name}_{value_min}-{value_max}.yaml")
 
-        return Path(name + "_" + value_min + "-" + value_max + ".yaml")
+    def _write_bin(self, edge_min, edge_max, base_path):
 
-    def run(self, base_dir=None):
+        # Each bin works on its own copy of the configuration, so bins can be written
+        # concurrently
+        fermi_config = copy.deepcopy(self.fermi_config)
+        value_min, value_max = f"{edge_min:.6g}", f"{edge_max:.6g}"
+        dir_name = self._make_dir_name(
+            name=self.axis_name, value_min=value_min, value_max=value_max
+        )
+        out_dir = base_path / dir_name
+        out_dir.mkdir(parents=True, exist_ok=True)
 
-        base_path = self._make_base_path(base_dir=base_dir)
+        fermi_config.add_entry(
+            primary_dict="selection", entry="phasemin", value=float(edge_min)
+        )
+        fermi_config.add_entry(
+            primary_dict="selection", entry="phasemax", value=float(edge_max)
+        )
 
-        for edge_min, edge_max in zip(
-            self.map_axis.edges_min.value, self.map_axis.edges_max.value
-        ):
+        outfile = self._make_config_name(
+            value_min=value_min, value_max=value_max, name=self.axis_name
+        )
+        fermi_config.write(out_dir / outfile)
 
-            dir_name = self._make_dir_name(
-                name=self.axis_name, value_min=edge_min, value_max=edge_max
-            )
-            out_dir = Path(os.path.join(base_path, dir_name))
-            out_dir.mkdir(parents=True, exist_ok=True)
+    def run(self, base_dir=None):
 
-            self.fermi_config.add_entry(
-                primary_dict="selection", entry="phasemin", value=float(edge_min)
-            )
-            self.fermi_config.add_entry(
-                primary_dict="selection", entry="phasemax", value=float(edge_max)
-            )
+        base_path = self._make_base_path(base_dir=base_dir)
+        edges_min = self.map_axis.edges_min.value
+        edges_max = self.map_axis.edges_max.value
 
-            outfile = self._make_config_name(
-                value_min=edge_min, value_max=edge_max, name=self.axis_name
-            )
-            full_path = Path(os.path.join(out_dir, outfile))
-            self.fermi_config.write(full_path)
+        with ThreadPoolExecutor(max_workers=min(32, len(edges_min) or 1)) as ex:
+            list(ex.map(self._write_bin, edges_min, edges_max, repeat(base_path)))
@@ -1,4 +1,12 @@
 from .exception import EphemerisKeyNotFound
+from .scripts import make_file_path
 from .testing import disable_logging_library
+from .timing import get_timing_model, load_fermi_toas
 
-__all__ = ["EphemerisKeyNotFound", "disable_logging_library"]
+__all__ = [
+    "EphemerisKeyNotFound",
+    "disable_logging_library",
+    "get_timing_model",
+    "load_fermi_toas",
+    "make_file_path",
+]
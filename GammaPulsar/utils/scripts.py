@@ -0,0 +1,31 @@
+import os
+import stat
+from gammapy.utils.scripts import make_path
+
+__all__ = ["make_file_path"]
+
+
+def make_file_path(filename):
+    """
+    Expand a path with `gammapy.utils.scripts.make_path` and check that it points to a regular file.
+
+    A single ``stat`` call is used for the check.
+
+    Parameters
+    ----------
+    filename : str or `pathlib.Path`
+        Path to the file
+
+    Returns
+    -------
+    path : `pathlib.Path`
+        Expanded path to the file
+    """
+    path = make_path(filename)
+    try:
+        is_file = stat.S_ISREG(os.stat(path).st_mode)
+    except OSError:
+        is_file = False
+    if not is_file:
+        raise FileNotFoundError(f"{filename} is not a path to a file.")
+    return path
@@ -5,16 +5,14 @@ __all__ = ["disable_logging_library"]
 
 
 def disable_logging_library(name):
-    @wraps(name)
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
             log.disable(name)
             try:
-                result = func(*args, **kwargs)
+                return func(*args, **kwargs)
             finally:
                 log.enable(name)
-            return result
 
         return wrapper
 
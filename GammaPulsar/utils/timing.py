@@ -0,0 +1,62 @@
+import copy
+import functools
+import os
+from astropy.io import fits
+from gammapy.utils.scripts import make_path
+from pint import models
+from pint.fermi_toas import load_Fermi_TOAs
+
+__all__ = ["get_timing_model", "load_fermi_toas"]
+
+
+@functools.lru_cache(maxsize=8)
+def _load_timing_model(ephemeris_file, mtime):
+    """
+    Load a PINT timing model, cached on the ephemeris file path and modification time.
+
+    ``mtime`` is not used to load the model, it is part of the cache key so that an edited
+    ephemeris file is reloaded.
+    """
+    return models.get_model(ephemeris_file)
+
+
+def get_timing_model(ephemeris_file):
+    """
+    Get the PINT timing model of an ephemeris file.
+
+    Models are cached, a model is only loaded again if its ephemeris file was modified. PINT can
+    modify a model, e.g. with ``add_tzr_toa``, so each call returns its own copy of the cached model.
+
+    Parameters
+    ----------
+    ephemeris_file : str or `pathlib.Path`
+        Path to the ephemeris file
+
+    Returns
+    -------
+    model : `pint.models.TimingModel`
+        Timing model
+    """
+    path = str(make_path(ephemeris_file))
+    return copy.deepcopy(_load_timing_model(path, os.stat(path).st_mtime_ns))
+
+
+def load_fermi_toas(**kwargs):
+    """
+    Load the TOAs of a Fermi-LAT events file with `pint.fermi_toas.load_Fermi_TOAs`.
+
+    PINT opens the events file with the default memmap setting of astropy, it is forced here so that
+    only the columns PINT uses are read from disk.
+
+    Parameters
+    ----------
+    **kwargs : dict
+        Keyword arguments to pass to `pint.fermi_toas.load_Fermi_TOAs`.
+
+    Returns
+    -------
+    toa_list : list of `pint.toa.TOA`
+        TOAs of the events
+    """
+    with fits.conf.set_temp("use_memmap", True):
+        return load_Fermi_TOAs(**kwargs)
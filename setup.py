@@ -11,7 +11,7 @@ setup(
             "scipy<1.10",
             "iminuit>=2.8.0" "regions>=0.5",
             "numpy<1.23",
-            "pint-pulsar~=0.9.3",
+            "pint-pulsar~=0.9.5",
             "fermipy",
             "black",
             "flake8",